@@ -0,0 +1,51 @@
+from pymongo import ReplaceOne, UpdateOne
+
+
+class BulkWriter():
+    """Buffers upserts for a collection and writes them as unordered bulk
+    writes of at most `batch_size` operations.
+    """
+    def __init__(self, collection, batch_size=500):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.operations = []
+        self.inserted = 0
+        self.modified = 0
+        self.unchanged = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+    def upsert(self, query, document):
+        """Replaces the document matching the query or inserts it."""
+        self.add(ReplaceOne(query, document, upsert=True))
+
+    def update(self, query, update):
+        """Applies the update to the document matching the query, inserting
+        it if it doesn't exist.
+        """
+        self.add(UpdateOne(query, update, upsert=True))
+
+    def add(self, operation):
+        """Buffers the operation and flushes if the buffer is full."""
+        self.operations.append(operation)
+        if len(self.operations) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes all buffered operations to the collection."""
+        if not self.operations:
+            return
+
+        result = self.collection.bulk_write(self.operations, ordered=False)
+        self.operations = []
+        self.inserted += result.upserted_count
+        self.modified += result.modified_count
+        self.unchanged += result.matched_count - result.modified_count
+
+    def __str__(self):
+        return (f"{self.collection.name}: {self.inserted} inserted, "
+                f"{self.modified} modified, {self.unchanged} unchanged")
@@ -1,40 +1,98 @@
-from datetime import date, timedelta
-from oauth2client.service_account import ServiceAccountCredentials
+from datetime import date, datetime, timedelta
+from lazy_object_proxy import Proxy
 from pymongo import MongoClient
-import gspread
 import os
 
-CLIENT = MongoClient()
-DB = CLIENT.utempian
+# MongoDB is only connected to when it is first used
+CLIENT = Proxy(MongoClient)
+DB = Proxy(lambda: CLIENT.utempian)
 
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 VOTE_THRESHOLD = 100.0
+
+# Score needed for a vote, the same as MIN_SCORE in utopian/app.py
+MIN_SCORE = 10
+
+# Review date of contributions that haven't been reviewed (yet)
+NO_REVIEW_DATE = datetime(1970, 1, 1)
 CONTRIBUTING = False
 
-if not CONTRIBUTING:
-    SCOPE = ["https://spreadsheets.google.com/feeds",
-             "https://www.googleapis.com/auth/drive"]
-    CREDENTIALS = ServiceAccountCredentials.from_json_keyfile_name(
-        f"{DIR_PATH}/client_secret.json", SCOPE)
-    GSPREAD_CLIENT = gspread.authorize(CREDENTIALS)
-    SHEET = GSPREAD_CLIENT.open("Utopian Reviews")
-
-    # Get date of current, next and previous Thursday
-    TODAY = date.today()
-    OFFSET = (TODAY.weekday() - 3) % 7
-    THIS_WEEK = TODAY - timedelta(days=OFFSET)
-    LAST_WEEK = THIS_WEEK - timedelta(days=7)
-    NEXT_WEEK = THIS_WEEK + timedelta(days=7)
-
-    # Reviewed
-    TITLE_PREVIOUS = f"Reviewed - {LAST_WEEK:%b} {LAST_WEEK.day} - {THIS_WEEK:%b} {THIS_WEEK.day}"
-    TITLE_CURRENT = f"Reviewed - {THIS_WEEK:%b} {THIS_WEEK.day} - {NEXT_WEEK:%b} {NEXT_WEEK.day}"
-    PREVIOUS_REVIEWED = SHEET.worksheet(TITLE_PREVIOUS)
-    CURRENT_REVIEWED = SHEET.worksheet(TITLE_CURRENT)
-
-    # Unreviewed
-    TITLE_UNREVIEWED = f"Unreviewed - {THIS_WEEK:%b} {THIS_WEEK.day} - {NEXT_WEEK:%b} {NEXT_WEEK.day}"
-    UNREVIEWED = SHEET.worksheet(TITLE_UNREVIEWED)
-
-    BANNED_USERS = SHEET.worksheet("Banned users")
-    VIPO = SHEET.worksheet("VIPO")
+# Number of rows enriched concurrently and the seconds allowed for all rows
+# of a worksheet together
+ENRICH_WORKERS = 8
+ENRICH_TIMEOUT = 300
+
+# Node used for batched JSON-RPC requests, the number of posts per batch and
+# the seconds allowed per batch
+STEEM_NODE = "https://api.steemit.com"
+RPC_BATCH_SIZE = 50
+RPC_TIMEOUT = 60
+
+# Number of upserts sent to MongoDB in a single bulk write
+BULK_SIZE = 500
+
+# Days of account history indexed for moderators that weren't indexed before
+REVIEW_COMMENT_DAYS = 14
+
+# Seconds between runs, maximum random delay added to that and maximum run
+# time of each job when update_database.py runs as a daemon
+JOB_SCHEDULE = {
+    "account": {"interval": 60, "jitter": 5, "timeout": 50},
+    "review_comments": {"interval": 600, "jitter": 60, "timeout": 1800},
+    "sheets": {"interval": 600, "jitter": 60, "timeout": 1800},
+}
+
+SCOPE = ["https://spreadsheets.google.com/feeds",
+         "https://www.googleapis.com/auth/drive"]
+TITLE_BANNED_USERS = "Banned users"
+TITLE_VIPO = "VIPO"
+
+
+class ReviewSheet():
+    """The "Utopian Reviews" spreadsheet, which is only opened when it is first
+    used, and the titles of the current week's worksheets.
+    """
+    def __init__(self):
+        self.this_week = None
+        self._sheet = None
+        self.refresh()
+
+    @property
+    def sheet(self):
+        if self._sheet is None:
+            import gspread
+            from oauth2client.service_account import (
+                ServiceAccountCredentials)
+
+            credentials = ServiceAccountCredentials.from_json_keyfile_name(
+                f"{DIR_PATH}/client_secret.json", SCOPE)
+            client = gspread.authorize(credentials)
+            self._sheet = client.open("Utopian Reviews")
+        return self._sheet
+
+    def refresh(self):
+        """Updates the worksheet titles and reopens the spreadsheet if the
+        week rolled over since they were last set. Returns whether it did.
+        """
+        # Get date of current, next and previous Thursday
+        today = date.today()
+        offset = (today.weekday() - 3) % 7
+        this_week = today - timedelta(days=offset)
+        if this_week == self.this_week:
+            return False
+
+        last_week = this_week - timedelta(days=7)
+        next_week = this_week + timedelta(days=7)
+        self.this_week = this_week
+        self._sheet = None
+
+        # Reviewed
+        self.title_previous = f"Reviewed - {last_week:%b} {last_week.day} - {this_week:%b} {this_week.day}"
+        self.title_current = f"Reviewed - {this_week:%b} {this_week.day} - {next_week:%b} {next_week.day}"
+
+        # Unreviewed
+        self.title_unreviewed = f"Unreviewed - {this_week:%b} {this_week.day} - {next_week:%b} {next_week.day}"
+        return True
+
+
+REVIEW_SHEET = ReviewSheet()
@@ -0,0 +1,54 @@
+import requests
+from beem.utils import resolve_authorperm
+
+import constants
+
+
+def content_request(request_id, url):
+    """Returns the JSON-RPC request for the content of the post at the URL."""
+    author, permlink = resolve_authorperm(url)
+    return {
+        "jsonrpc": "2.0",
+        "method": "condenser_api.get_content",
+        "params": [author, permlink],
+        "id": request_id
+    }
+
+
+def resolvable(url):
+    """Checks if the author and permlink can be read from the URL."""
+    try:
+        resolve_authorperm(url)
+    except Exception:
+        return False
+    return True
+
+
+def get_content(urls, batch_size=constants.RPC_BATCH_SIZE):
+    """Returns the content of the posts at the given URLs, indexed by URL,
+    using JSON-RPC batch requests of at most `batch_size` posts.
+
+    Posts whose batch failed and malformed URLs are left out, so they can
+    still be fetched on their own. Posts that don't exist have an empty
+    author.
+    """
+    urls = [url for url in set(urls) if resolvable(url)]
+    content = {}
+
+    with requests.Session() as session:
+        for start in range(0, len(urls), batch_size):
+            batch = urls[start:start + batch_size]
+            payload = [content_request(i, url) for i, url in enumerate(batch)]
+            try:
+                response = session.post(constants.STEEM_NODE, json=payload,
+                                        timeout=constants.RPC_TIMEOUT)
+                response.raise_for_status()
+                results = response.json()
+            except Exception:
+                continue
+
+            for result in results:
+                if "result" in result:
+                    content[batch[result["id"]]] = result["result"]
+
+    return content
@@ -1,3 +1,6 @@
+import hashlib
+
+
 class Contribution():
     def __init__(self, row):
         self.moderator = row[0]
@@ -12,3 +15,10 @@ class Contribution():
         self.review_status = row[9]
         self.vote_status = row[10]
         self.weight = row[11]
+
+    def fingerprint(self, status):
+        """Returns a hash of the row's fields and the sheet it was read from,
+        used to detect rows that changed since the last run.
+        """
+        fields = [status] + list(vars(self).values())
+        return hashlib.sha1("\x1f".join(fields).encode()).hexdigest()
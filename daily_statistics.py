@@ -0,0 +1,156 @@
+import argparse
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import groupby
+
+from dateutil.parser import parse
+from pymongo import ASCENDING
+
+import constants
+
+
+def new_bucket(day, kind, key):
+    """Returns an empty bucket of the additive statistics of a day."""
+    return {
+        "day": day,
+        "kind": kind,
+        "key": key,
+        "count": 0,
+        "voted": 0,
+        "unvoted": 0,
+        "rewardable": 0,
+        "task_requests": 0,
+        "scores": 0,
+        "scores_without_0": 0,
+        "count_without_0": 0,
+        "total_payout": 0,
+        "utopian_total": 0,
+        "utopian_count": 0,
+        "moderators": Counter(),
+        "categories": Counter(),
+        "rewarded_contributors": Counter(),
+    }
+
+
+def daily_buckets(day, contributions):
+    """Returns the statistics of the given day's contributions per category,
+    project and moderator.
+    """
+    buckets = {}
+
+    def bucket(kind, key):
+        return buckets.setdefault((kind, key), new_bucket(day, kind, key))
+
+    for contribution in contributions:
+        if contribution["status"] == "unreviewed":
+            continue
+
+        score = contribution["score"] or 0
+        rewarded = score > constants.MIN_SCORE
+        utopian_vote = contribution["utopian_vote"]
+        unvoted = contribution["status"] == "unvoted"
+        moderator = contribution["moderator"]
+        category = contribution["category"]
+
+        # Voted is counted like in the category and project statistics
+        category_bucket = bucket("category", category)
+        project_bucket = bucket("project", contribution["repository"])
+        category_bucket["rewardable"] += not unvoted and rewarded
+        category_bucket["voted"] += (not unvoted and rewarded and
+                                     utopian_vote > 0)
+        project_bucket["voted"] += (not unvoted and
+                                    bool(contribution["voted_on"]))
+        project_bucket["task_requests"] += "task" in category
+        if rewarded:
+            category_bucket["rewarded_contributors"][
+                contribution["author"]] += 1
+        for value in [category_bucket, project_bucket]:
+            value["moderators"][moderator] += 1
+
+        buckets_of_contribution = [category_bucket, project_bucket]
+        if moderator != "BANNED":
+            moderator_bucket = bucket("moderator", moderator)
+            moderator_bucket["categories"][category] += 1
+            buckets_of_contribution.append(moderator_bucket)
+
+        for value in buckets_of_contribution:
+            value["count"] += 1
+            value["unvoted"] += unvoted
+            value["scores"] += score
+            value["total_payout"] += contribution["total_payout"]
+            if score > 0:
+                value["scores_without_0"] += score
+                value["count_without_0"] += 1
+            if utopian_vote != 0:
+                value["utopian_total"] += utopian_vote
+                value["utopian_count"] += 1
+
+    # Names can contain dots, so counters are stored as lists of pairs
+    for value in buckets.values():
+        for counter in ["moderators", "categories", "rewarded_contributors"]:
+            value[counter] = value[counter].most_common()
+
+    return list(buckets.values())
+
+
+def day_of(review_date):
+    """Returns the start of the day of the review date."""
+    return datetime(review_date.year, review_date.month, review_date.day)
+
+
+def update_daily_statistics(review_dates):
+    """Recalculates the statistics of every day that contains one of the
+    given review dates.
+    """
+    days = {day_of(review_date) for review_date in review_dates}
+
+    for day in days:
+        contributions = constants.DB.contributions.find(
+            {"review_date": {"$gte": day, "$lt": day + timedelta(days=1)}})
+        buckets = daily_buckets(day, contributions)
+        constants.DB.daily_stats.delete_many({"day": day})
+        if buckets:
+            constants.DB.daily_stats.insert_many(buckets)
+
+
+def backfill(start=None, end=None):
+    """Rebuilds the statistics of every day from `start` until `end` from
+    the contributions in the database, reading them in a single pass.
+    """
+    days = {"$gt": constants.NO_REVIEW_DATE}
+    if start:
+        days["$gte"] = day_of(start)
+    if end:
+        days["$lt"] = day_of(end)
+
+    constants.DB.daily_stats.delete_many({"day": days})
+    contributions = constants.DB.contributions.find(
+        {"review_date": days}).sort("review_date", ASCENDING)
+
+    for day, day_contributions in groupby(
+            contributions, key=lambda c: day_of(c["review_date"])):
+        buckets = daily_buckets(day, day_contributions)
+        if buckets:
+            constants.DB.daily_stats.insert_many(buckets)
+        print(f"{datetime.now()} - {day:%Y-%m-%d}: {len(buckets)} buckets")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backfill", action="store_true",
+                        help="rebuild the daily statistics from the database")
+    parser.add_argument("--from", dest="start", type=parse,
+                        help="first day to rebuild (default: the first)")
+    parser.add_argument("--to", dest="end", type=parse,
+                        help="day to stop at, exclusive (default: the last)")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill(args.start, args.end)
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
+
@@ -0,0 +1,146 @@
+import time
+from datetime import datetime
+from threading import Thread
+
+from beem.amount import Amount
+from beem.blockchain import Blockchain
+from beem.comment import Comment
+from beem.utils import construct_authorperm
+
+import constants
+from update_database import (bump_generation, refresh_statistics,
+                             utopian_vote_of)
+
+# Number of blocks between saving the checkpoint
+CHECKPOINT_INTERVAL = 20
+
+# Seconds to wait before restarting a stream that failed
+RESTART_DELAY = 10
+
+# Streams that are followed as checkpoint name: (operations, virtual)
+# Payouts are virtual operations, which aren't included in regular blocks
+STREAMS = {
+    "follower": (["vote"], False),
+    "follower-payouts": (["author_reward"], True),
+}
+
+
+def get_checkpoint(name):
+    """Returns the block the stream should start from."""
+    checkpoint = constants.DB.checkpoints.find_one({"name": name})
+    if checkpoint:
+        return checkpoint["block"]
+    return Blockchain().get_current_block_num()
+
+
+def save_checkpoint(name, block):
+    """Saves the block the stream reached."""
+    constants.DB.checkpoints.replace_one(
+        {"name": name}, {"name": name, "block": block}, True)
+
+
+def update_vote(authorperm):
+    """Updates utopian-io's vote on the contribution."""
+    contributions = constants.DB.contributions
+    contribution = contributions.find_one(
+        {"authorperm": authorperm}, {"review_date": 1})
+    if not contribution:
+        return
+
+    utopian_vote, _ = utopian_vote_of(Comment(authorperm))
+    update = {"voted_on": bool(utopian_vote), "utopian_vote": utopian_vote}
+    contributions.update_one({"authorperm": authorperm}, {"$set": update})
+
+    # Voted contributions are no longer pending
+    if utopian_vote:
+        contributions.update_one(
+            {"authorperm": authorperm, "status": "pending"},
+            {"$set": {"status": "reviewed"}})
+    refresh_statistics([contribution["review_date"]])
+    bump_generation()
+
+
+def update_payout(authorperm):
+    """Sets the final payout of the contribution and finalizes it."""
+    contributions = constants.DB.contributions
+    contribution = contributions.find_one(
+        {"authorperm": authorperm}, {"review_date": 1})
+    if not contribution:
+        return
+
+    comment = Comment(authorperm)
+    utopian_vote, vote_settled = utopian_vote_of(comment)
+    update = {
+        "total_payout": Amount(comment.json()["total_payout_value"]).amount,
+        "total_votes": comment.json()["net_votes"],
+        "total_comments": comment.json()["children"],
+        "voted_on": bool(utopian_vote),
+        "utopian_vote": utopian_vote,
+        "finalized": vote_settled
+    }
+    contributions.update_one({"authorperm": authorperm}, {"$set": update})
+    refresh_statistics([contribution["review_date"]])
+    bump_generation()
+
+
+def apply(operation):
+    """Applies the operation to the contribution it concerns, if any."""
+    authorperm = construct_authorperm(
+        operation["author"], operation["permlink"])
+    if operation["type"] == "vote":
+        if operation["voter"] == "utopian-io":
+            update_vote(authorperm)
+    else:
+        update_payout(authorperm)
+
+
+def stream(name):
+    """Streams the operations of the stream with the given name from its
+    checkpoint and applies those that concern contributions in the database.
+    """
+    operations, virtual = STREAMS[name]
+    start = get_checkpoint(name)
+    saved = start
+
+    for operation in Blockchain().stream(
+            opNames=operations, start=start, only_virtual_ops=virtual):
+        # A failed update, e.g. a node error or a race with update_database
+        # rebuilding the same statistics, mustn't stop the stream
+        try:
+            apply(operation)
+        except Exception as error:
+            print(f"{datetime.now()} - {name}: {operation['type']} of "
+                  f"@{operation['author']}/{operation['permlink']}: {error}")
+
+        # Operations of the saved block are applied again after a restart,
+        # which is harmless since every update is idempotent
+        block = operation["block_num"]
+        if block >= saved + CHECKPOINT_INTERVAL:
+            save_checkpoint(name, block)
+            saved = block
+
+
+def follow(name):
+    """Follows the stream with the given name forever, restarting it from
+    its checkpoint when it fails.
+    """
+    while True:
+        try:
+            stream(name)
+        except Exception as error:
+            print(f"{datetime.now()} - {name}: {error}, restarting")
+        time.sleep(RESTART_DELAY)
+
+
+def main():
+    threads = [Thread(target=follow, args=(name,), daemon=True)
+               for name in STREAMS]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import argparse
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+import constants
+
+# Indexes of each collection as (keys, options)
+INDEXES = {
+    "contributions": [
+        ([("url", ASCENDING)], {"unique": True}),
+        ([("status", ASCENDING), ("review_status", ASCENDING)], {}),
+        ([("review_status", ASCENDING)], {}),
+        ([("review_date", ASCENDING)], {}),
+        ([("author", ASCENDING)], {}),
+        ([("moderator", ASCENDING)], {}),
+        ([("repository", ASCENDING)], {}),
+        ([("category", ASCENDING)], {}),
+        ([("authorperm", ASCENDING)], {}),
+    ],
+    "users": [([("name", ASCENDING)], {"unique": True})],
+    "accounts": [([("account", ASCENDING)], {"unique": True})],
+    "moderators": [([("account", ASCENDING)], {"unique": True})],
+    "vipo": [([("account", ASCENDING)], {"unique": True})],
+    "weekly_stats": [([("date", ASCENDING)], {"unique": True})],
+    "weekly_posts": [([("date", ASCENDING)], {"unique": True})],
+    "daily_stats": [
+        ([("day", ASCENDING), ("kind", ASCENDING), ("key", ASCENDING)],
+         {"unique": True}),
+    ],
+    "review_comments": [
+        ([("parent", ASCENDING), ("moderator", ASCENDING)], {"unique": True}),
+    ],
+    "review_cursors": [([("account", ASCENDING)], {"unique": True})],
+    "checkpoints": [([("name", ASCENDING)], {"unique": True})],
+}
+
+
+def query_shapes():
+    """Returns an example of every query the application issues as
+    (collection, query), where the query of an aggregation is its pipeline.
+    """
+    # Only needed here, so the updater doesn't import the web application
+    from utopian.app import (category_pipeline, moderator_pipeline,
+                             project_pipeline)
+
+    now = datetime.now()
+    week_ago = now - timedelta(days=7)
+    week = {"review_date": {"$gte": week_ago, "$lt": now}}
+    return [
+        ("contributions", {"status": "unreviewed"}),
+        ("contributions", {"$or": [{"status": "pending"},
+                                   {"review_status": "pending"}]}),
+        ("contributions", week),
+        ("contributions", {"$and": [week, {"staff_picked": True}]}),
+        ("contributions", {"$and": [week, {"category": {"$regex": "task"}}]}),
+        ("contributions", {"url": ""}),
+        ("contributions", {"url": {"$in": [""]}}),
+        ("contributions", {"author": ""}),
+        ("contributions", {"moderator": ""}),
+        ("contributions", {"repository": ""}),
+        ("contributions", {"category": ""}),
+        ("contributions", {"voted_on": True}),
+        ("contributions", {"_id": {"$gt": ObjectId()}}),
+        ("contributions", {"authorperm": ""}),
+        ("contributions", [{"$match": {"review_date": {
+            "$gte": week_ago, "$lte": now}}}]),
+        ("contributions", moderator_pipeline(week)),
+        ("contributions", category_pipeline(week)),
+        ("contributions", project_pipeline(week)),
+        ("users", {"name": ""}),
+        ("accounts", {"account": "utopian-io"}),
+        ("moderators", {"account": ""}),
+        ("vipo", {"account": ""}),
+        ("weekly_stats", {"date": now}),
+        ("weekly_stats", {"date": {"$in": [now]}}),
+        ("weekly_posts", {"date": now}),
+        ("weekly_posts", {"date": {"$in": [now]}}),
+        ("daily_stats", {"day": {"$gte": week_ago, "$lt": now}}),
+        ("review_comments", {"parent": {"$in": [""]}}),
+        ("review_cursors", {"account": ""}),
+        ("checkpoints", {"name": "follower"}),
+        ("generation", {"_id": "data"}),
+    ]
+
+
+def ensure_indexes():
+    """Creates all indexes that don't exist yet."""
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                constants.DB[collection].create_index(keys, **options)
+            except OperationFailure as error:
+                print(f"{datetime.now()} - Couldn't create index {keys} on "
+                      f"{collection}: {error}")
+
+
+def winning_plan(explanation):
+    """Returns the winning plan of an explained query or aggregation."""
+    if "queryPlanner" not in explanation:
+        explanation = explanation["stages"][0]["$cursor"]
+    plan = explanation["queryPlanner"]["winningPlan"]
+    # Plans of the slot based execution engine are nested
+    return plan.get("queryPlan", plan)
+
+
+def stages(plan):
+    """Returns the names of all stages in the query plan."""
+    names = [plan["stage"]]
+    for child in plan.get("inputStages", []) + [plan.get("inputStage")]:
+        if child:
+            names += stages(child)
+    return names
+
+
+def explain():
+    """Explains every query shape and flags those that scan the whole
+    collection.
+    """
+    for collection, query in query_shapes():
+        if isinstance(query, list):
+            explanation = constants.DB.command(
+                "aggregate", collection, pipeline=query, explain=True)
+            description = f"aggregate {query[0]['$match']}"
+        else:
+            explanation = constants.DB[collection].find(query).explain()
+            description = str(query)
+        plan_stages = stages(winning_plan(explanation))
+        flag = "COLLSCAN" if "COLLSCAN" in plan_stages else "ok"
+        print(f"{flag:8} {collection} {description} -> "
+              f"{' > '.join(plan_stages)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--explain", action="store_true",
+                        help="explain every query and flag collection scans")
+    args = parser.parse_args()
+
+    ensure_indexes()
+    if args.explain:
+        explain()
+
+
+if __name__ == '__main__':
+    main()
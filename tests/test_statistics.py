@@ -0,0 +1,107 @@
+import importlib
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+app = importlib.import_module("utopian.app")
+
+DATE = datetime(2018, 5, 24)
+MATCH = {"review_date": {"$gte": DATE - timedelta(days=7), "$lt": DATE}}
+
+CATEGORIES = ["development", "tutorials", "translations", "task-development"]
+MODERATORS = ["amosbastian", "espoem", "helo", "BANNED"]
+AUTHORS = ["ajmaln", "fuzzythumb", "jaff8", "mcfarhat", "yokunjon"]
+PROJECTS = ["steemit/condenser", "utopian-io/utopian.io", "beem/beem"]
+
+
+def random_contributions(seed, size=150):
+    """Returns contributions with random values, including the edge cases
+    the statistics have to handle: unreviewed contributions, missing scores,
+    scores of 0, mixed integers and floats and ties.
+    """
+    rng = random.Random(seed)
+    contributions = []
+    for _ in range(size):
+        contributions.append({
+            "_id": ObjectId(),
+            "status": rng.choice(
+                ["reviewed", "reviewed", "unvoted", "pending", "unreviewed"]),
+            "moderator": rng.choice(MODERATORS),
+            "author": rng.choice(AUTHORS),
+            "category": rng.choice(CATEGORIES),
+            "repository": rng.choice(PROJECTS),
+            "score": rng.choice([None, 0, 0.0, 5, 10, 20, 30, 55.5, 100]),
+            "utopian_vote": rng.choice([0, 0, 1, 3, 2.5, 7.25]),
+            "voted_on": rng.choice([True, False]),
+            "total_payout": rng.choice([0, 1, 2.75, 12.5, 40]),
+            "review_date": DATE - timedelta(minutes=rng.randrange(14 * 1440)),
+        })
+    return contributions
+
+
+def assert_same(actual, expected):
+    """Asserts that both results are equal, with numbers of the same type
+    and floats only differing by rounding.
+    """
+    if isinstance(expected, dict):
+        assert sorted(actual) == sorted(expected)
+        for key in expected:
+            assert_same(actual[key], expected[key])
+    elif isinstance(expected, (list, tuple)):
+        assert len(actual) == len(expected)
+        for actual_value, expected_value in zip(actual, expected):
+            assert_same(actual_value, expected_value)
+    elif isinstance(expected, (int, float)) and not isinstance(expected, bool):
+        assert type(actual) == type(expected)
+        assert actual == pytest.approx(expected)
+    else:
+        assert actual == expected
+
+
+@pytest.fixture(scope="module")
+def client():
+    """Connects to the local MongoDB, skipping the tests if it isn't
+    running.
+    """
+    client = MongoClient(serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("MongoDB isn't running")
+    return client
+
+
+@pytest.fixture
+def database(client, monkeypatch):
+    """Replaces the application's database with an empty test database."""
+    client.drop_database("utempian_test")
+    monkeypatch.setattr(app, "DB", client.utempian_test)
+    yield client.utempian_test
+    client.drop_database("utempian_test")
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("aggregation, statistics", [
+    (app.moderator_aggregation, app.moderator_statistics),
+    (app.category_aggregation, app.category_statistics),
+    (app.project_aggregation, app.project_statistics),
+])
+def test_aggregation_parity(database, aggregation, statistics, seed):
+    database.contributions.insert_many(random_contributions(seed))
+    contributions = list(database.contributions.find(MATCH).sort("_id", 1))
+
+    assert_same(aggregation(MATCH), statistics(contributions))
+
+
+@pytest.mark.parametrize("aggregation, statistics", [
+    (app.moderator_aggregation, app.moderator_statistics),
+    (app.category_aggregation, app.category_statistics),
+    (app.project_aggregation, app.project_statistics),
+])
+def test_aggregation_parity_without_contributions(database, aggregation,
+                                                  statistics):
+    assert_same(aggregation(MATCH), statistics([]))
@@ -1,18 +1,109 @@
+import argparse
+import fcntl
 import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import date, datetime, timedelta
+from multiprocessing import Process
+from threading import Thread
 
 import requests
 from beem.account import Account
 from beem.amount import Amount
 from beem.comment import Comment
+from beem.exceptions import VoteDoesNotExistsException
+from beem.utils import construct_authorperm, resolve_authorperm
 from beem.vote import Vote
 from dateutil.parser import parse
 
 import constants
+from bulk_writer import BulkWriter
+from content_fetcher import get_content
 from contribution import Contribution
-
-
-VIPO_LIST = [vipo["account"] for vipo in constants.DB.vipo.find()]
+from daily_statistics import update_daily_statistics
+from indexes import ensure_indexes
+
+
+class RunContext():
+    """Account state and VIPO that are loaded once per run and shared by
+    every row that is enriched during it.
+    """
+    def __init__(self):
+        account = constants.DB.accounts.find_one({"account": "utopian-io"})
+        recharge_time = account["recharge_time"]
+        hours, minutes, seconds = [int(x) for x in recharge_time.split(":")]
+        self.recharging = timedelta(
+            hours=hours, minutes=minutes, seconds=seconds)
+        self.vipo = {vipo["account"] for vipo in constants.DB.vipo.find()}
+        self.review_comments = {}
+
+        # Moderators whose history was read up to its end by the last run of
+        # the review comments job
+        self.indexed = {cursor["account"] for cursor in
+                        constants.DB.review_cursors.find({"caught_up": True})}
+
+    def load_review_comments(self, urls):
+        """Loads the indexed moderator replies to the posts at the URLs."""
+        parents = []
+        for url in urls:
+            try:
+                parents.append(construct_authorperm(*resolve_authorperm(url)))
+            except Exception:
+                # Malformed URLs are skipped when the row is enriched
+                continue
+        replies = constants.DB.review_comments.find(
+            {"parent": {"$in": parents}})
+        for reply in replies:
+            key = (reply["parent"], reply["moderator"])
+            self.review_comments[key] = reply
+
+    def review_comment(self, comment, moderator):
+        """Returns the moderator's reply to the post, reading the post's
+        replies if the moderator's history isn't indexed yet.
+        """
+        moderator = moderator.strip().lower()
+        if moderator in self.indexed:
+            return self.review_comments.get((comment.authorperm, moderator))
+
+        for reply in comment.get_replies():
+            if reply.author == moderator:
+                return {"created": reply["created"],
+                        "permlink": reply.permlink}
+        return None
+
+
+class SheetValues():
+    """The rows of all given worksheets, read in a single batched request and
+    shared by every job in a run.
+    """
+    def __init__(self, sheet, titles):
+        ranges = ["'{}'".format(title.replace("'", "''")) for title in titles]
+        response = sheet.values_batch_get(ranges)
+        self.rows = {}
+
+        for title, value_range in zip(titles, response["valueRanges"]):
+            values = value_range.get("values", [])
+            # Pad rows like `get_all_values` does, since trailing empty cells
+            # aren't returned
+            width = max([len(row) for row in values], default=0)
+            self.rows[title] = [row + [""] * (width - len(row))
+                                for row in values]
+
+    def get(self, title):
+        """Returns all rows of the worksheet with the given title."""
+        return self.rows[title]
+
+
+def read_sheets():
+    """Reads all worksheets needed by the sync jobs."""
+    review_sheet = constants.REVIEW_SHEET
+    review_sheet.refresh()
+    titles = [review_sheet.title_previous, review_sheet.title_current,
+              review_sheet.title_unreviewed, constants.TITLE_BANNED_USERS,
+              constants.TITLE_VIPO]
+    return SheetValues(review_sheet.sheet, titles)
 
 
 class User():
@@ -32,47 +123,166 @@ def beneficiary_set(post):
     return False
 
 
-def valid_age(post):
+def valid_age(post, context):
     """Checks if post is within last twelve hours before payout."""
-    account = constants.DB.accounts.find_one({"account": "utopian-io"})
-    recharge_time = account["recharge_time"]
-    hours, minutes, seconds = [int(x) for x in recharge_time.split(":")]
-    recharging = timedelta(hours=hours, minutes=minutes, seconds=seconds)
-
-    if post.time_elapsed() + recharging > timedelta(days=6, hours=12):
+    if post.time_elapsed() + context.recharging > timedelta(days=6, hours=12):
         return False
     return True
 
 
-def contribution(row, status):
-    """Convert row to dictionary, only selecting values we want."""
-    contribution = Contribution(row)
-    url = contribution.url
+def payout_window_open(database_contribution):
+    """Checks if the contribution was last enriched before its payout, so its
+    payout and votes can still change.
+    """
+    payout = database_contribution["created"] + timedelta(days=7)
+    enriched = database_contribution.get("enriched", datetime(1970, 1, 1))
+    return enriched < payout
 
-    if url == "":
-        return
 
-    database_contribution = constants.DB.contributions.find_one({"url": url})
+def utopian_vote_of(post):
+    """Returns the value of utopian-io's vote on the post in SBD and whether
+    that value could be determined. The value is taken from the post's active
+    votes, and only looked up separately if the post has none.
+    """
+    if "active_votes" not in post:
+        try:
+            return Vote(f"{post.authorperm}|utopian-io").sbd, True
+        except VoteDoesNotExistsException:
+            return 0, True
+        except Exception:
+            return 0, False
+
+    for vote in post["active_votes"]:
+        if vote["voter"] == "utopian-io":
+            try:
+                return post.steem.rshares_to_sbd(int(vote["rshares"])), True
+            except Exception:
+                return 0, False
+    return 0, True
 
-    if contribution.staff_pick.lower() == "yes":
-        staff_picked = True
-    else:
-        staff_picked = False
 
+def review_date_of(contribution):
+    """Returns the contribution's review date, or the epoch if it has none."""
     try:
-        review_date = parse(contribution.review_date)
+        return parse(contribution.review_date)
     except Exception:
-        review_date = datetime(1970, 1, 1)
+        return constants.NO_REVIEW_DATE
+
+
+def needs_enrichment(row, status, database_contribution=None):
+    """Checks if the row should be fetched from the blockchain."""
+    contribution = Contribution(row)
+
+    if contribution.url == "":
+        return False
+
+    # Finalized contributions are never fetched from the chain again, their
+    # sheet fields are updated by `sheet_updates` instead
+    if database_contribution and database_contribution.get("finalized"):
+        return False
+
+    # Skip rows that haven't changed since the post was paid out
+    fingerprint = contribution.fingerprint(status)
+    if (database_contribution and
+            database_contribution.get("fingerprint") == fingerprint and
+            not payout_window_open(database_contribution)):
+        return False
 
-    if ((datetime.now() - review_date).seconds > 561600 and
+    # Rows reviewed long ago are only fetched while their stored payout can
+    # still change
+    review_date = review_date_of(contribution)
+    if ((datetime.now() - review_date).total_seconds() > 561600 and
             status != "unreviewed"):
+        if (not database_contribution or
+                not payout_window_open(database_contribution)):
+            return False
+
+    return True
+
+
+def sheet_fields(contribution, status, voted_on):
+    """Returns the fields of the contribution that are read from the sheet,
+    which can be updated without fetching the post.
+    """
+    # Add status for unvoted and pending
+    if contribution.vote_status == "Unvoted":
+        status = "unvoted"
+    elif contribution.vote_status == "Pending":
+        status = "pending"
+
+    # The sheet is updated after the vote, so like the follower treat voted
+    # contributions as no longer pending
+    if status == "pending" and voted_on:
+        status = "reviewed"
+
+    # Check for when contribution not reviewed
+    if contribution.score == "":
+        score = None
+    else:
+        try:
+            score = float(contribution.score)
+        except Exception:
+            score = None
+
+    return {
+        "moderator": contribution.moderator.strip(),
+        "repository": contribution.repository,
+        "category": contribution.category,
+        "staff_picked": contribution.staff_pick.lower() == "yes",
+        "picked_by": contribution.picked_by,
+        "status": status,
+        "score": score,
+        "review_status": contribution.review_status.lower(),
+    }
+
+
+def sheet_updates(rows, status, stored):
+    """Returns the sheet fields of the finalized contributions whose row
+    changed, indexed by their URL. These are updated without fetching them
+    from the chain again.
+    """
+    updates = {}
+    for row in rows:
+        contribution = Contribution(row)
+        database_contribution = stored.get(contribution.url)
+        if not database_contribution:
+            continue
+
+        fingerprint = contribution.fingerprint(status)
+        if (not database_contribution.get("finalized") or
+                database_contribution.get("fingerprint") == fingerprint):
+            continue
+
+        fields = sheet_fields(
+            contribution, status, database_contribution["voted_on"])
+        fields["fingerprint"] = fingerprint
+        updates[contribution.url] = fields
+    return updates
+
+
+def contribution(row, status, context, database_contribution=None,
+                 content=None):
+    """Convert row to dictionary, only selecting values we want. The post is
+    built from `content` if it was already fetched.
+    """
+    contribution = Contribution(row)
+    url = contribution.url
+
+    if url == "":
         return
 
+    fingerprint = contribution.fingerprint(status)
+    review_date = review_date_of(contribution)
     total_payout = 0
 
     # Check if post deleted
     try:
-        comment = Comment(url)
+        if content is None:
+            comment = Comment(url)
+        elif not content["author"]:
+            return
+        else:
+            comment = Comment(content)
     except Exception:
         return
 
@@ -81,13 +291,13 @@ def contribution(row, status):
             comment_url = database_contribution["comment_url"]
         else:
             if contribution.review_status == "Pending":
-                for reply in comment.get_replies():
-                    if reply.author == contribution.moderator:
-                        review_date = reply["created"]
-                        comment_url = reply.permlink
-                        break
+                reply = context.review_comment(
+                    comment, contribution.moderator)
+                if reply:
+                    review_date = reply["created"]
+                    comment_url = reply["permlink"]
                 else:
-                    review_date = datetime(1970, 1, 1)
+                    review_date = constants.NO_REVIEW_DATE
                     comment_url = ""
             else:
                 comment_url = ""
@@ -95,7 +305,8 @@ def contribution(row, status):
         comment_url = ""
 
     # Calculate total (pending) payout of contribution
-    if comment.time_elapsed() > timedelta(days=7):
+    paid_out = comment.time_elapsed() > timedelta(days=7)
+    if paid_out:
         total_payout = Amount(comment.json()["total_payout_value"]).amount
     else:
         total_payout = Amount(comment.json()["pending_payout_value"]).amount
@@ -105,44 +316,19 @@ def contribution(row, status):
     comments = comment.json()["children"]
     author = comment.author
 
-    # Add status for unvoted and pending
-    if contribution.vote_status == "Unvoted":
-        status = "unvoted"
-    elif contribution.vote_status == "Pending":
-        status = "pending"
-
-    try:
-        utopian_vote = Vote(f"{comment.authorperm}|utopian-io").sbd
-    except Exception:
-        voted_on = False
-        utopian_vote = 0
+    utopian_vote, vote_settled = utopian_vote_of(comment)
 
     if utopian_vote:
         voted_on = True
     else:
         voted_on = False
 
-    # Check for when contribution not reviewed
-    if contribution.score == "":
-        score = None
-    else:
-        try:
-            score = float(contribution.score)
-        except Exception:
-            score = None
-
     # Create contribution dictionary and return it
     new_contribution = {
-        "moderator": contribution.moderator.strip(),
         "author": author,
         "review_date": review_date,
         "url": url,
-        "repository": contribution.repository,
-        "category": contribution.category,
-        "staff_picked": staff_picked,
-        "picked_by": contribution.picked_by,
-        "status": status,
-        "score": score,
+        "authorperm": comment.authorperm,
         "voted_on": voted_on,
         "total_payout": total_payout,
         "total_votes": votes,
@@ -150,33 +336,179 @@ def contribution(row, status):
         "utopian_vote": utopian_vote,
         "created": comment["created"],
         "title": comment.title,
-        "review_status": contribution.review_status.lower(),
         "comment_url": comment_url,
         "beneficiaries_set": beneficiary_set(comment),
-        "is_vipo": author in VIPO_LIST,
-        "valid_age": valid_age(comment)
+        "is_vipo": author in context.vipo,
+        "valid_age": valid_age(comment, context),
+        "fingerprint": fingerprint,
+        "finalized": paid_out and vote_settled,
+        "enriched": datetime.utcnow()
     }
+    new_contribution.update(sheet_fields(contribution, status, voted_on))
 
     return new_contribution
 
 
-def get_reviewed():
+def get_reviewed(values):
     """Return all the rows in the most recent two review worksheets."""
-    previous = constants.PREVIOUS_REVIEWED.get_all_values()
-    current = constants.CURRENT_REVIEWED.get_all_values()
+    previous = values.get(constants.REVIEW_SHEET.title_previous)
+    current = values.get(constants.REVIEW_SHEET.title_current)
     reviewed = previous[1:] + current[1:]
     return reviewed
 
 
-def get_unreviewed():
+def get_unreviewed(values):
     """Return all the rows in the unreviewed worksheet."""
-    unreviewed = constants.UNREVIEWED.get_all_values()
+    unreviewed = values.get(constants.REVIEW_SHEET.title_unreviewed)
     return unreviewed[1:]
 
 
-def update_posts(local=False):
+def stored_contributions(rows):
+    """Returns the contributions already in the database for the given rows,
+    indexed by their URL.
+    """
+    urls = [row[2] for row in rows if row[2]]
+    contributions = constants.DB.contributions.find({"url": {"$in": urls}})
+    return {c["url"]: c for c in contributions}
+
+
+def enrich(rows, status, context, stored):
+    """Converts the given rows to contributions concurrently, skipping the
+    rows that aren't done within `ENRICH_TIMEOUT` seconds. `stored` are the
+    contributions already in the database, indexed by their URL.
+    """
+    rows = [row for row in rows
+            if needs_enrichment(row, status, stored.get(row[2]))]
+    content = get_content([row[2] for row in rows])
+    context.load_review_comments([row[2] for row in rows])
+
+    executor = ThreadPoolExecutor(max_workers=constants.ENRICH_WORKERS)
+    futures = [executor.submit(contribution, row, status, context,
+                               stored.get(row[2]), content.get(row[2]))
+               for row in rows]
+
+    # All rows share a single deadline, so slow rows can't add up
+    done, not_done = wait(futures, timeout=constants.ENRICH_TIMEOUT)
+    for future in not_done:
+        future.cancel()
+
+    # Rows that already started can't be stopped, but don't wait for them;
+    # the job's timeout ends them at the latest
+    executor.shutdown(wait=False)
+
+    return [future.result() if future in done else None
+            for future in futures]
+
+
+def update_review_comments():
+    """Indexes the replies moderators made to other posts, reading each
+    moderator's account history from where the previous run stopped.
+    """
+    cursors = constants.DB.review_cursors
+
+    def save_cursor(account, index, caught_up=False):
+        cursors.replace_one(
+            {"account": account},
+            {"account": account, "index": index, "caught_up": caught_up},
+            upsert=True)
+
+    for moderator in constants.DB.moderators.find():
+        account = moderator["account"]
+        cursor = cursors.find_one({"account": account})
+        if cursor:
+            start = cursor["index"] + 1
+        else:
+            # Only recent reviews can still be pending, so new moderators
+            # don't need their whole history indexed
+            start = datetime.utcnow() - timedelta(
+                days=constants.REVIEW_COMMENT_DAYS)
+        last_index = cursor["index"] if cursor else None
+        caught_up = False
+
+        try:
+            history = Account(account).history(
+                start=start, use_block_num=False, only_ops=["comment"])
+            with BulkWriter(constants.DB.review_comments,
+                            constants.BULK_SIZE) as writer:
+                for read, operation in enumerate(history, 1):
+                    if (operation["parent_author"] and
+                            operation["author"] == account):
+                        parent = construct_authorperm(
+                            operation["parent_author"],
+                            operation["parent_permlink"])
+                        created = operation["timestamp"]
+                        if isinstance(created, str):
+                            created = parse(created)
+
+                        # Edits are also comment operations, so only keep
+                        # the first one
+                        writer.update(
+                            {"parent": parent, "moderator": account},
+                            {"$setOnInsert": {
+                                "permlink": operation["permlink"],
+                                "created": created
+                            }}
+                        )
+                    last_index = operation["index"]
+
+                    # Save the progress regularly, since the job is
+                    # terminated if it takes too long
+                    if read % constants.BULK_SIZE == 0:
+                        writer.flush()
+                        save_cursor(account, last_index)
+            caught_up = True
+        except Exception as error:
+            # Resume from the last operation that was read
+            print(f"{datetime.now()} - review comments of {account}: {error}")
+
+        if last_index is not None:
+            save_cursor(account, last_index, caught_up)
+
+
+def week_ends(review_dates, inclusive=False):
+    """Returns the dates of every stored week that contains one of the given
+    review dates. Only weeks ending at midnight are stored, and a week ending
+    on a date covers the seven days before it, including the date itself if
+    `inclusive` is set.
+    """
+    dates = set()
+    for review_date in review_dates:
+        day = datetime(review_date.year, review_date.month, review_date.day)
+        for days in range(8):
+            end = day + timedelta(days=days)
+            if end > review_date or (inclusive and end == review_date):
+                dates.add(end)
+    return list(dates)
+
+
+def invalidate_weekly_statistics(review_dates):
+    """Removes the materialized statistics of every week that contains one of
+    the given review dates, so they are recomputed when next requested.
+    """
+    constants.DB.weekly_stats.delete_many(
+        {"date": {"$in": week_ends(review_dates)}})
+
+    # The weekly post also includes contributions reviewed on its date
+    constants.DB.weekly_posts.delete_many(
+        {"date": {"$in": week_ends(review_dates, inclusive=True)}})
+
+
+def refresh_statistics(review_dates):
+    """Updates the stored statistics after contributions with the given
+    review dates changed.
+    """
+    # Contributions without a review date aren't in any statistics
+    review_dates = {review_date for review_date in review_dates
+                    if review_date != constants.NO_REVIEW_DATE}
+    if not review_dates:
+        return
+
+    invalidate_weekly_statistics(review_dates)
+    update_daily_statistics(review_dates)
+
+
+def update_posts(values=None, local=False):
     """Adds all reviewed and unreviewed contributions to the database."""
-    contributions = constants.DB.contributions
     if local:
         with open(f"{constants.DIR_PATH}/contributions.json") as json_data:
             posts = json.load(json_data)
@@ -186,37 +518,57 @@ def update_posts(local=False):
                 post["created"] = parse(post["created"])
             if "review_date" in post.keys():
                 post["review_date"] = parse(post["review_date"])
+        updates = {}
+        stored = {}
     else:
-        reviewed = get_reviewed()
-        unreviewed = get_unreviewed()
-        reviewed = [contribution(x, "reviewed") for x in reviewed]
-        unreviewed = [contribution(x, "unreviewed") for x in unreviewed]
-        posts = reviewed + unreviewed
+        context = RunContext()
+        posts = []
+        updates = {}
+        stored = {}
+        for rows, status in [(get_reviewed(values), "reviewed"),
+                             (get_unreviewed(values), "unreviewed")]:
+            sheet_stored = stored_contributions(rows)
+            stored.update(sheet_stored)
+            posts += enrich(rows, status, context, sheet_stored)
+            updates.update(sheet_updates(rows, status, sheet_stored))
+
+    posts = [post for post in posts if post]
+    with BulkWriter(constants.DB.contributions, constants.BULK_SIZE) as writer:
+        for post in posts:
+            writer.upsert({"url": post["url"]}, post)
+        for url, fields in updates.items():
+            writer.update({"url": url}, {"$set": fields})
 
-    for post in posts:
-        if post:
-            contributions.replace_one({"url": post["url"]}, post, True)
+    # A changed contribution is removed from the statistics of the day it was
+    # previously reviewed on as well
+    changed = [post["url"] for post in posts] + list(updates)
+    review_dates = [post["review_date"] for post in posts]
+    review_dates += [stored[url]["review_date"] for url in changed
+                     if url in stored and "review_date" in stored[url]]
+    refresh_statistics(review_dates)
+    return writer
 
 
-def update_banned():
+def update_banned(values):
     """Updates banned users."""
-    users = constants.DB.users
-
-    for user in constants.BANNED_USERS.get_all_values()[1:]:
-        try:
-            user = User(user)
-        except ValueError:
-            continue
-
-        banned_until = user.ban_start + timedelta(days=user.ban_length)
-        user.banned_until = banned_until
+    with BulkWriter(constants.DB.users, constants.BULK_SIZE) as writer:
+        for user in values.get(constants.TITLE_BANNED_USERS)[1:]:
+            try:
+                user = User(user)
+            except ValueError:
+                continue
+
+            banned_until = user.ban_start + timedelta(days=user.ban_length)
+            user.banned_until = banned_until
+
+            if user.banned == "Yes":
+                user.banned = True
+            else:
+                user.banned = False
 
-        if user.banned == "Yes":
-            user.banned = True
-        else:
-            user.banned = False
+            writer.upsert({"name": user.name}, user.__dict__)
 
-        users.update({"name": user.name}, user.__dict__, upsert=True)
+    return writer
 
 
 def update_account():
@@ -245,53 +597,177 @@ def update_account():
             "current_vp": current_vp,
             "recharge_time": recharge_time,
             "recharge_class": recharge_class,
+            "voting_value": account.get_voting_value_SBD(),
             "updated": datetime.now()
         },
         upsert=True
     )
 
 
-def update_moderators():
+def update_moderators(values):
     """Update moderators who reviewed something in the last 2 weeks."""
-    reviewed = get_reviewed()
+    reviewed = get_reviewed(values)
     accounts = set([row[0] for row in reviewed])
-    moderators = constants.DB.moderators
 
-    for account in accounts:
-        if account.upper() not in ["BANNED", "IGNORED", "IGNORE",
-                                   "IRRELEVANT"]:
-            moderators.update(
-                {"account": account.lower()},
-                {"account": account.lower()}, upsert=True)
+    with BulkWriter(constants.DB.moderators, constants.BULK_SIZE) as writer:
+        for account in accounts:
+            if account.upper() not in ["BANNED", "IGNORED", "IGNORE",
+                                       "IRRELEVANT"]:
+                writer.upsert(
+                    {"account": account.lower()}, {"account": account.lower()})
 
+    return writer
 
-def get_vipo():
+
+def get_vipo(values):
     """Return all VIPO."""
-    return constants.VIPO.col_values(1)[1:]
+    return [row[0] for row in values.get(constants.TITLE_VIPO)[1:]]
 
 
-def update_vipo():
+def update_vipo(values):
     """Update VIPO."""
-    vipo_list = get_vipo()
-    vipo = constants.DB.vipo
+    vipo_list = get_vipo(values)
 
-    for account in vipo_list:
-        vipo.update(
-            {"account": account.lower().strip()},
-            {"account": account.lower().strip()}, upsert=True)
+    with BulkWriter(constants.DB.vipo, constants.BULK_SIZE) as writer:
+        for account in vipo_list:
+            writer.upsert(
+                {"account": account.lower().strip()},
+                {"account": account.lower().strip()})
 
+    return writer
 
-def main():
+
+def report(writer):
+    """Prints how many documents the given writer inserted and modified."""
+    print(f"{datetime.now()} - {writer}")
+
+
+def bump_generation(name="data"):
+    """Increments the generation of the given data, which invalidates the
+    web application's cached responses that depend on it: "data" for the
+    contributions and statistics or "account" for the account data.
+    """
+    constants.DB.generation.update_one(
+        {"_id": name}, {"$inc": {"value": 1}}, upsert=True)
+
+
+def sync_account():
+    """Job that updates the utopian-io account data."""
+    update_account()
+    bump_generation("account")
+
+
+def sync_sheets():
+    """Job that updates everything that is read from the spreadsheet."""
     if constants.CONTRIBUTING:
-        update_account()
-        update_posts(True)
+        report(update_posts(local=True))
+    else:
+        values = read_sheets()
+        report(update_posts(values))
+        report(update_banned(values))
+        report(update_moderators(values))
+        report(update_vipo(values))
+
+    bump_generation()
+
+
+def sync_review_comments():
+    """Job that indexes the replies of moderators to contributions."""
+    if not constants.CONTRIBUTING:
+        update_review_comments()
+
+
+# When the jobs run once, review comments are indexed before the sheets are read
+JOBS = {
+    "account": sync_account,
+    "review_comments": sync_review_comments,
+    "sheets": sync_sheets,
+}
+
+
+@contextmanager
+def job_lock(name):
+    """Acquires the job's lock file without blocking and yields whether it
+    succeeded, so the same job never runs twice at once, even across
+    processes.
+    """
+    with open(f"{constants.DIR_PATH}/.{name}.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_job(name):
+    """Runs the job in its own process and terminates it if it takes longer
+    than its timeout.
+    """
+    timeout = constants.JOB_SCHEDULE[name]["timeout"]
+
+    with job_lock(name) as acquired:
+        if not acquired:
+            print(f"{datetime.now()} - {name}: still running, skipping")
+            return
+
+        process = Process(target=JOBS[name])
+        process.start()
+        process.join(timeout)
+
+        if process.is_alive():
+            process.terminate()
+            process.join()
+            print(f"{datetime.now()} - {name}: timed out after {timeout}s")
+
+
+def schedule(name):
+    """Runs the job forever, waiting its interval plus a random jitter between
+    the start of each run.
+    """
+    interval = constants.JOB_SCHEDULE[name]["interval"]
+    jitter = constants.JOB_SCHEDULE[name]["jitter"]
+
+    while True:
+        started = time.time()
+        run_job(name)
+        delay = started + interval + random.uniform(0, jitter) - time.time()
+        time.sleep(max(delay, 0))
+
+
+def run_daemon():
+    """Runs every job on its own schedule."""
+    threads = [Thread(target=schedule, args=(name,), daemon=True)
+               for name in JOBS]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and schedule each job separately")
+    args = parser.parse_args()
+
+    # Like the jobs, create the indexes in a child process, since a MongoDB
+    # client isn't fork-safe and the parent mustn't create one
+    process = Process(target=ensure_indexes)
+    process.start()
+    process.join()
+
+    if args.daemon:
+        run_daemon()
     else:
-        update_account()
-        update_posts()
-        update_banned()
-        update_moderators()
-        update_vipo()
+        for name in JOBS:
+            run_job(name)
+
 
 if __name__ == '__main__':
     main()
-
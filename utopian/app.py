@@ -1,22 +1,30 @@
+import hashlib
 import json
 import logging
 import os
-from collections import Counter, defaultdict
+import threading
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from datetime import date, datetime, timedelta
+from functools import wraps
 from itertools import zip_longest
 from operator import itemgetter
 from statistics import mean
 
 import numpy as np
 import timeago
-from beem.account import Account
 from beem.comment import Comment
-from bson import json_util
+from bson import ObjectId, json_util
 from dateutil.parser import parse
-from flask import Flask, abort, jsonify, render_template
+from flask import (Flask, abort, json as flask_json, jsonify,
+                   make_response, render_template, request,
+                   stream_with_context)
 from flask_cors import CORS
 from flask_restful import Api, Resource
-from pymongo import MongoClient
+from pymongo import ASCENDING, MongoClient
 from webargs import fields, validate
 from webargs.flaskparser import abort, parser, use_args, use_kwargs
 
@@ -60,6 +68,17 @@ MODERATION_REWARD = {
 # Score needed for a vote
 MIN_SCORE = 10
 
+# Number of responses and total bytes of their bodies kept in the response
+# cache
+CACHE_SIZE = 256
+CACHE_BYTES = 32 * 1024 * 1024
+
+# Number of post titles fetched concurrently for the weekly post
+TITLE_WORKERS = 8
+
+# Seconds between reading the utopian-io account data written by the updater
+ACCOUNT_TTL = 30
+
 # Logging
 DIR_PATH = os.path.dirname(os.path.realpath(__file__))
 LOGGER = logging.getLogger("utopian-io")
@@ -71,14 +90,109 @@ FORMATTER = logging.Formatter(
 FH.setFormatter(FORMATTER)
 LOGGER.addHandler(FH)
 
+
+class MongoJSONEncoder(flask_json.JSONEncoder):
+    """Encodes BSON types such as ObjectId and datetime like
+    `bson.json_util` does, so documents can be passed to `jsonify` directly.
+    """
+    def default(self, o):
+        try:
+            return json_util.default(o)
+        except TypeError:
+            return super().default(o)
+
+
 # Mongo and Flask
 CLIENT = MongoClient()
 DB = CLIENT.utempian
 app = Flask(__name__)
+app.json_encoder = MongoJSONEncoder
 CORS(app)
 api = Api(app)
 
 
+class ResponseCache():
+    """LRU cache of responses that is emptied whenever the generation of the
+    data, which the updater increments after every job, changes.
+    """
+    def __init__(self, max_size, max_bytes):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.generation = None
+        self.responses = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, generation):
+        """Returns the cached response for the key, if it is still valid."""
+        with self.lock:
+            if generation != self.generation:
+                self.responses.clear()
+                self.bytes = 0
+                self.generation = generation
+                return None
+
+            if key not in self.responses:
+                return None
+            self.responses.move_to_end(key)
+            return self.responses[key]
+
+    def set(self, key, generation, response):
+        """Caches the response, evicting the least recently used ones while
+        the cache is full. Responses that don't fit at all aren't cached.
+        """
+        body = response[0]
+        with self.lock:
+            if generation != self.generation or len(body) > self.max_bytes:
+                return
+            if key in self.responses:
+                self.bytes -= len(self.responses.pop(key)[0])
+            self.responses[key] = response
+            self.bytes += len(body)
+            while (len(self.responses) > self.max_size or
+                   self.bytes > self.max_bytes):
+                _, evicted = self.responses.popitem(last=False)
+                self.bytes -= len(evicted[0])
+
+
+RESPONSE_CACHE = ResponseCache(CACHE_SIZE, CACHE_BYTES)
+
+
+def data_generation(name="data"):
+    """Returns the generation of the given data in the database: "data" for
+    the contributions and statistics or "account" for the account data.
+    """
+    generation = DB.generation.find_one({"_id": name})
+    return generation["value"] if generation else 0
+
+
+def cached(view):
+    """Caches the view's responses by path and query parameters until the
+    data generation changes. Streamed responses are passed through, since
+    caching them would mean reading them into memory first, and so are
+    responses marked `no-store`.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.path,
+               tuple(sorted(request.args.items(multi=True))))
+        generation = data_generation()
+        cached_response = RESPONSE_CACHE.get(key, generation)
+
+        if cached_response is None:
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code != 200 or response.is_streamed or
+                    response.cache_control.no_store):
+                return response
+            cached_response = (response.get_data(), response.status_code,
+                               list(response.headers.items()))
+            RESPONSE_CACHE.set(key, generation, cached_response)
+
+        body, status, headers = cached_response
+        return app.response_class(body, status=status, headers=headers)
+    return wrapper
+
+
 @app.template_filter("timeago")
 def time_ago(date):
     return timeago.format(date)
@@ -121,6 +235,24 @@ def without_score(contribution):
     return {x: contribution[x] for x in contribution if x != "score"}
 
 
+# Fields `convert` needs, which are always retrieved from the database
+CONVERT_FIELDS = ["score", "staff_picked", "category", "is_vipo",
+                  "beneficiaries_set"]
+
+
+def encode_cursor(object_id):
+    """Returns the opaque cursor of the page after the given _id."""
+    return urlsafe_b64encode(object_id.binary).decode()
+
+
+def decode_cursor(cursor):
+    """Returns the _id the given cursor continues from."""
+    try:
+        return ObjectId(urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        abort(422, errors="Invalid cursor")
+
+
 class ContributionResource(Resource):
     """Endpoint for contributions in the spreadsheet."""
     query_parameters = {
@@ -138,25 +270,61 @@ class ContributionResource(Resource):
         "valid_age": fields.Bool(),
         "skip": fields.Int(),
         "limit": fields.Int(),
+        "cursor": fields.Str(),
+        "fields": fields.DelimitedList(fields.Str()),
     }
 
     @use_args(query_parameters)
     def get(self, query_parameters):
         """Uses the given query parameters to search for contributions in the
-        database.
+        database. When a limit is given the header `X-Next-Cursor` contains
+        the cursor of the next page, if there is one.
         """
         parameters = {key: value for key, value in query_parameters.items()
-                      if key != "skip" and key != "limit"}
-        contributions = DB.contributions.find(parameters)
-
+                      if key not in ["skip", "limit", "cursor", "fields"]}
+        if "cursor" in query_parameters.keys():
+            parameters["_id"] = {
+                "$gt": decode_cursor(query_parameters["cursor"])}
+
+        # Also retrieve the fields needed to convert the contribution
+        requested = query_parameters.get("fields")
+        projection = requested + CONVERT_FIELDS if requested else None
+        contributions = DB.contributions.find(parameters, projection)
+
+        # Pages are ordered by their _id, so the cursor can continue from it
+        if "cursor" in query_parameters or "limit" in query_parameters:
+            contributions = contributions.sort("_id", ASCENDING)
         if "skip" in query_parameters.keys():
             contributions = contributions.skip(query_parameters["skip"])
-        if "limit" in query_parameters.keys():
-            contributions = contributions.limit(query_parameters["limit"])
 
-        contributions = [json.loads(json_util.dumps(convert(c)))
-                         for c in contributions]
-        return jsonify(contributions)
+        headers = {}
+        if "limit" in query_parameters.keys():
+            limit = query_parameters["limit"]
+            contributions = list(contributions.limit(limit))
+            if contributions and len(contributions) == limit:
+                headers["X-Next-Cursor"] = encode_cursor(
+                    contributions[-1]["_id"])
+
+        def encode(contribution):
+            contribution = convert(contribution)
+            if requested:
+                contribution = {key: value
+                                for key, value in contribution.items()
+                                if key in requested}
+            return flask_json.dumps(contribution, separators=(",", ":"))
+
+        def generate():
+            """Encodes the contributions one at a time as they are read."""
+            yield "["
+            for i, contribution in enumerate(contributions):
+                if i > 0:
+                    yield ","
+                yield encode(contribution)
+            yield "]\n"
+
+        return app.response_class(
+            stream_with_context(generate()), mimetype="application/json",
+            headers=headers)
 
 
 class BannedUsersResource(Resource):
@@ -168,8 +336,7 @@ class BannedUsersResource(Resource):
 
     @use_args(query_parameters)
     def get(self, query_parameters):
-        banned_users = [json.loads(json_util.dumps(user))
-                        for user in DB.users.find(query_parameters)]
+        banned_users = list(DB.users.find(query_parameters))
         return jsonify(banned_users)
 
 
@@ -194,6 +361,12 @@ def average(score):
         return 0
 
 
+def score_of(contribution):
+    """Returns the contribution's score, counting a missing score as 0."""
+    score = contribution["score"]
+    return 0 if score is None else score
+
+
 def percentage(reviewed, voted):
     """Returns the percentage of voted contributions."""
     try:
@@ -225,11 +398,11 @@ def moderator_statistics(contributions):
         )
 
         # Append scores and categories
-        moderators[moderator]["average_score"].append(contribution["score"])
+        score = score_of(contribution)
+        moderators[moderator]["average_score"].append(score)
         moderators[moderator]["category"].append(contribution["category"])
-        if contribution["score"] > 0:
-            moderators[moderator]["average_without_0"].append(
-                contribution["score"])
+        if score > 0:
+            moderators[moderator]["average_without_0"].append(score)
 
     moderator_list = []
     for moderator, value in moderators.items():
@@ -270,7 +443,7 @@ def category_statistics(contributions):
         category = contribution["category"]
         moderator = contribution["moderator"]
         author = contribution["author"]
-        score = contribution["score"]
+        score = score_of(contribution)
         total_payout = contribution["total_payout"]
         utopian_vote = contribution["utopian_vote"]
 
@@ -388,13 +561,13 @@ def project_statistics(contributions):
 
         # Add moderator and score
         projects[project]["moderators"].append(contribution["moderator"])
-        projects[project]["average_score"].append(contribution["score"])
+        score = score_of(contribution)
+        projects[project]["average_score"].append(score)
         projects[project]["total_payout"] += contribution["total_payout"]
         projects[project]["utopian_total"].append(utopian_vote)
 
-        if contribution["score"] > 0:
-            projects[project]["average_without_0"].append(
-                contribution["score"])
+        if score > 0:
+            projects[project]["average_without_0"].append(score)
 
     project_list = []
     for project, value in projects.items():
@@ -440,29 +613,437 @@ def task_request_statistics(contributions):
     return {"task_requests": task_requests}
 
 
+def ratio(total, count):
+    """Returns total / count, or 0 if there is nothing to divide by, like
+    `average` does for empty lists.
+    """
+    if count == 0:
+        return 0
+    return total / count
+
+
+def mean_ratio(total, count):
+    """Returns the mean of `count` values that add up to `total` like
+    `average` does, so a whole mean of integers is an integer.
+    """
+    if isinstance(total, int) and count and total % count == 0:
+        return total // count
+    return ratio(total, count)
+
+
+def reviewed_stage(match):
+    """Returns the stage matching the reviewed contributions in `match`."""
+    return {"$match": {"$and": [match, {"status": {"$ne": "unreviewed"}}]}}
+
+
+def score_accumulators(score):
+    """Returns the accumulators needed for `average_score` and
+    `average_without_0` of the given score field.
+    """
+    score = {"$ifNull": [score, 0]}
+    positive = {"$gt": [score, 0]}
+    return {
+        "count": {"$sum": 1},
+        "scores": {"$sum": score},
+        "scores_without_0": {"$sum": {"$cond": [positive, score, 0]}},
+        "count_without_0": {"$sum": {"$cond": [positive, 1, 0]}},
+    }
+
+
+def most_common_stages(group, field, contribution_id="$_id"):
+    """Returns the stages counting `field` per `group`, ordered like
+    `Counter.most_common`: by count and then by first occurrence.
+    """
+    return [
+        {"$group": {
+            "_id": {"group": group, "name": field},
+            "first": {"$min": contribution_id},
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"count": -1, "first": 1}},
+        {"$group": {
+            "_id": "$_id.group",
+            "most_common": {"$push": {"name": "$_id.name", "count": "$count"}}
+        }},
+    ]
+
+
+def most_common(groups):
+    """Converts the output of `most_common_stages` to a dictionary of each
+    group's `Counter.most_common` list.
+    """
+    return {group["_id"]: [[value["name"], value["count"]]
+                           for value in group["most_common"]]
+            for group in groups}
+
+
+def moderator_pipeline(match):
+    """Returns the pipeline calculating `moderator_statistics` of the
+    contributions in `match`.
+    """
+    return [
+        reviewed_stage(match),
+        {"$match": {"moderator": {"$ne": "BANNED"}}},
+        {"$facet": {
+            "totals": [
+                {"$group": dict(
+                    {"_id": "$moderator", "first": {"$min": "$_id"}},
+                    **score_accumulators("$score"))},
+                {"$sort": {"first": 1}},
+            ],
+            "category": most_common_stages("$moderator", "$category"),
+        }},
+    ]
+
+
+def moderator_aggregation(match):
+    """Returns the same result as `moderator_statistics`, calculated by
+    MongoDB.
+    """
+    result = next(DB.contributions.aggregate(moderator_pipeline(match)))
+    categories = most_common(result["category"])
+
+    moderator_list = []
+    for group in result["totals"]:
+        moderator_list.append({
+            "moderator": group["_id"],
+            "category": categories[group["_id"]],
+            "average_score": mean_ratio(group["scores"], group["count"]),
+            "average_without_0": mean_ratio(group["scores_without_0"],
+                                            group["count_without_0"]),
+        })
+
+    return {"moderators": moderator_list}
+
+
+def category_pipeline(match):
+    """Returns the pipeline calculating `category_statistics` of the
+    contributions in `match`.
+    """
+    unvoted = {"$eq": ["$contribution.status", "unvoted"]}
+    rewardable = {"$and": [
+        {"$not": [unvoted]},
+        {"$gt": ["$contribution.score", MIN_SCORE]}
+    ]}
+    voted = {"$and": [
+        rewardable, {"$gt": ["$contribution.utopian_vote", 0]}]}
+    utopian_vote = "$contribution.utopian_vote"
+    contribution_id = "$contribution._id"
+
+    return [
+        reviewed_stage(match),
+        # Count every contribution for both its category and "all"
+        {"$project": {"contribution": "$$ROOT",
+                      "group": ["$category", "all"]}},
+        {"$unwind": "$group"},
+        {"$facet": {
+            "totals": [
+                {"$group": dict({
+                    "_id": "$group",
+                    "first": {"$min": contribution_id},
+                    "voted": {"$sum": {"$cond": [voted, 1, 0]}},
+                    "unvoted": {"$sum": {"$cond": [unvoted, 1, 0]}},
+                    "rewardable": {"$sum": {"$cond": [rewardable, 1, 0]}},
+                    "total_payout": {"$sum": "$contribution.total_payout"},
+                    "utopian_total": {"$sum": utopian_vote},
+                    "utopian_count": {"$sum": {
+                        "$cond": [{"$ne": [utopian_vote, 0]}, 1, 0]}},
+                }, **score_accumulators("$contribution.score"))},
+                {"$sort": {"first": 1}},
+            ],
+            "moderators": most_common_stages(
+                "$group", "$contribution.moderator", contribution_id),
+            "rewarded_contributors": [
+                {"$match": {"contribution.score": {"$gt": MIN_SCORE}}},
+            ] + most_common_stages(
+                "$group", "$contribution.author", contribution_id),
+            "authors": [
+                {"$group": {
+                    "_id": {"group": "$group",
+                            "author": "$contribution.author"},
+                    "vote_weights": {"$push": utopian_vote},
+                    "scores": {"$push": {
+                        "$ifNull": ["$contribution.score", 0]}}
+                }},
+            ],
+        }},
+    ]
+
+
+def category_aggregation(match):
+    """Returns the same result as `category_statistics`, calculated by
+    MongoDB.
+    """
+    result = next(DB.contributions.aggregate(category_pipeline(match)))
+    moderators = most_common(result["moderators"])
+    rewarded_contributors = most_common(result["rewarded_contributors"])
+    authors_vote_weights = defaultdict(dict)
+    authors_scores = defaultdict(dict)
+    for group in result["authors"]:
+        category, author = group["_id"]["group"], group["_id"]["author"]
+        authors_vote_weights[category][author] = group["vote_weights"]
+        authors_scores[category][author] = group["scores"]
+
+    # "all" is always the first category, even without contributions
+    totals = {"all": {"_id": "all", "count": 0, "voted": 0, "unvoted": 0,
+                      "rewardable": 0, "total_payout": 0, "utopian_total": 0,
+                      "utopian_count": 0, "scores": 0, "scores_without_0": 0,
+                      "count_without_0": 0}}
+    totals.update((group["_id"], group) for group in result["totals"])
+
+    category_list = []
+    for category, group in totals.items():
+        value = {
+            "category": category,
+            "average_score": mean_ratio(group["scores"], group["count"]),
+            "average_without_0": mean_ratio(group["scores_without_0"],
+                                            group["count_without_0"]),
+            "voted": group["voted"],
+            "not_voted": group["count"] - group["voted"],
+            "unvoted": group["unvoted"],
+            "rewardable": group["rewardable"],
+            "moderators": moderators.get(category, []),
+            "rewarded_contributors": rewarded_contributors.get(category, []),
+            "total_payout": group["total_payout"],
+            "authors_vote_weights": authors_vote_weights[category],
+            "authors_scores": authors_scores[category],
+            "reviewed": group["count"],
+            "average_payout": ratio(group["total_payout"], group["count"]),
+            "pct_voted": percentage(group["count"], group["voted"]),
+            "average_utopian_vote": mean_ratio(group["utopian_total"],
+                                               group["utopian_count"]),
+            "utopian_total": group["utopian_total"],
+        }
+        if category == "all":
+            value["task-requests"] = 0
+        category_list.append(value)
+
+    return {"categories": category_list}
+
+
+def project_pipeline(match):
+    """Returns the pipeline calculating `project_statistics` of the
+    contributions in `match`.
+    """
+    unvoted = {"$eq": ["$status", "unvoted"]}
+    voted = {"$and": [{"$not": [unvoted]}, "$voted_on"]}
+    task_request = {"$gte": [{"$indexOfCP": ["$category", "task"]}, 0]}
+
+    return [
+        reviewed_stage(match),
+        {"$facet": {
+            "totals": [
+                {"$group": dict({
+                    "_id": "$repository",
+                    "first": {"$min": "$_id"},
+                    "voted": {"$sum": {"$cond": [voted, 1, 0]}},
+                    "unvoted": {"$sum": {"$cond": [unvoted, 1, 0]}},
+                    "task-requests": {"$sum": {
+                        "$cond": [task_request, 1, 0]}},
+                    "total_payout": {"$sum": "$total_payout"},
+                    "utopian_total": {"$sum": "$utopian_vote"},
+                    "utopian_count": {"$sum": {
+                        "$cond": [{"$ne": ["$utopian_vote", 0]}, 1, 0]}},
+                }, **score_accumulators("$score"))},
+                {"$sort": {"first": 1}},
+            ],
+            "moderators": most_common_stages("$repository", "$moderator"),
+        }},
+    ]
+
+
+def project_aggregation(match):
+    """Returns the same result as `project_statistics`, calculated by
+    MongoDB.
+    """
+    result = next(DB.contributions.aggregate(project_pipeline(match)))
+    moderators = most_common(result["moderators"])
+
+    project_list = []
+    for group in result["totals"]:
+        project = group["_id"]
+        project_list.append({
+            "project": project,
+            "average_score": mean_ratio(group["scores"], group["count"]),
+            "average_without_0": mean_ratio(group["scores_without_0"],
+                                            group["count_without_0"]),
+            "voted": group["voted"],
+            "not_voted": group["count"] - group["voted"],
+            "unvoted": group["unvoted"],
+            "task-requests": group["task-requests"],
+            "moderators": moderators[project],
+            "average_payout": group["total_payout"] / group["count"],
+            "total_payout": group["total_payout"],
+            "reviewed": group["count"],
+            "pct_voted": percentage(group["count"], group["voted"]),
+            "average_utopian_vote": mean_ratio(group["utopian_total"],
+                                               group["utopian_count"]),
+            "utopian_total": group["utopian_total"],
+        })
+
+    return {"projects": project_list}
+
+
 class WeeklyResource(Resource):
     """Endpoint for weekly contribution data (requested)."""
+    @cached
     def get(self, date):
         LOGGER.info(f"Retrieving for {date}")
         # Get date for retrieving posts
         date = string_to_date(date)
+
+        # Serve the materialized statistics of the week if they exist
+        weekly_stats = DB.weekly_stats.find_one({"date": date})
+        if weekly_stats:
+            return app.response_class(
+                weekly_stats["body"], mimetype="application/json")
+
+        body = self.statistics(date)
+
+        # Only weeks ending at midnight are requested repeatedly; the updater
+        # removes them once contributions in them change
+        if date == datetime(date.year, date.month, date.day):
+            DB.weekly_stats.replace_one(
+                {"date": date}, {"date": date, "body": body}, True)
+
+        return app.response_class(body, mimetype="application/json")
+
+    @staticmethod
+    def statistics(date):
+        """Returns the statistics of the week before the given date as
+        JSON.
+        """
         week_ago = date - timedelta(days=7)
+        match = {"review_date": {"$gte": week_ago, "$lt": date}}
 
-        # Retrieve contributions made in week before the given date
-        contributions = DB.contributions
-        pipeline = [
-            {"$match": {"review_date": {"$gte": week_ago, "$lt": date}}}]
-        contributions = [json.loads(json_util.dumps(c))
-                         for c in contributions.aggregate(pipeline)]
+        # Group the contributions reviewed in the week in MongoDB
+        moderators = moderator_aggregation(match)
+        categories = category_aggregation(match)
+        projects = project_aggregation(match)
 
-        moderators = moderator_statistics(contributions)
-        categories = category_statistics(contributions)
-        projects = project_statistics(contributions)
-        staff_picks = staff_pick_statistics(contributions)
-        task_requests = task_request_statistics(contributions)
+        # Only the staff picks and task requests are retrieved in full
+        staff_picks = DB.contributions.find(
+            {"$and": [match, {"staff_picked": True}]})
+        staff_picks = staff_pick_statistics(staff_picks)
+        task_requests = DB.contributions.find(
+            {"$and": [match, {"category": {"$regex": "task"}}]})
+        task_requests = task_request_statistics(task_requests)
 
         return jsonify(
-            [moderators, categories, projects, staff_picks, task_requests])
+            [moderators, categories, projects, staff_picks,
+             task_requests]).get_data(as_text=True)
+
+
+# Counters of the daily buckets that are added up for a date range
+BUCKET_COUNTERS = ["count", "voted", "unvoted", "rewardable", "task_requests",
+                   "scores", "scores_without_0", "count_without_0",
+                   "total_payout", "utopian_total", "utopian_count"]
+BUCKET_LISTS = ["moderators", "categories", "rewarded_contributors"]
+
+
+def empty_bucket():
+    """Returns a bucket without any contributions."""
+    return dict({counter: 0 for counter in BUCKET_COUNTERS},
+                **{name: Counter() for name in BUCKET_LISTS})
+
+
+def combine_buckets(buckets):
+    """Adds up the daily buckets of each kind and key, in order of their
+    first appearance.
+    """
+    combined = OrderedDict()
+    for bucket in buckets:
+        total = combined.setdefault(
+            (bucket["kind"], bucket["key"]), empty_bucket())
+        for counter in BUCKET_COUNTERS:
+            total[counter] += bucket[counter]
+        for name in BUCKET_LISTS:
+            total[name].update(dict(bucket[name]))
+    return combined
+
+
+def bucket_statistics(bucket):
+    """Returns the statistics every kind of bucket has in common."""
+    return {
+        "average_score": mean_ratio(bucket["scores"], bucket["count"]),
+        "average_without_0": mean_ratio(bucket["scores_without_0"],
+                                        bucket["count_without_0"]),
+        "voted": bucket["voted"],
+        "not_voted": bucket["count"] - bucket["voted"],
+        "unvoted": bucket["unvoted"],
+        "reviewed": bucket["count"],
+        "total_payout": bucket["total_payout"],
+        "average_payout": ratio(bucket["total_payout"], bucket["count"]),
+        "pct_voted": percentage(bucket["count"], bucket["voted"]),
+        "utopian_total": bucket["utopian_total"],
+        "average_utopian_vote": mean_ratio(bucket["utopian_total"],
+                                           bucket["utopian_count"]),
+    }
+
+
+def range_statistics(start, end):
+    """Returns the moderator, category and project statistics of the
+    contributions reviewed from `start` until `end`, combined from the daily
+    buckets. Ties in the most common lists are ordered by name.
+    """
+    buckets = DB.daily_stats.find(
+        {"day": {"$gte": start, "$lt": end}}).sort("day", ASCENDING)
+    combined = combine_buckets(buckets)
+
+    def most_common(counter):
+        return sorted(counter.items(), key=lambda x: (-x[1], x[0]))
+
+    # "all" is the sum of every category and always comes first
+    everything = combine_buckets(
+        dict(bucket, kind="category", key="all")
+        for (kind, _), bucket in combined.items() if kind == "category")
+    everything = everything.get(("category", "all"), empty_bucket())
+    buckets = [(("category", "all"), everything)] + list(combined.items())
+
+    moderator_list, category_list, project_list = [], [], []
+    for (kind, key), bucket in buckets:
+        value = bucket_statistics(bucket)
+        if kind == "moderator":
+            moderator_list.append({
+                "moderator": key,
+                "category": most_common(bucket["categories"]),
+                "average_score": value["average_score"],
+                "average_without_0": value["average_without_0"],
+            })
+        elif kind == "category":
+            value.update(
+                category=key, rewardable=bucket["rewardable"],
+                moderators=most_common(bucket["moderators"]),
+                rewarded_contributors=most_common(
+                    bucket["rewarded_contributors"]))
+            if key == "all":
+                value["task-requests"] = 0
+            category_list.append(value)
+        else:
+            value.update(project=key, moderators=most_common(
+                bucket["moderators"]))
+            value["task-requests"] = bucket["task_requests"]
+            project_list.append(value)
+
+    return [{"moderators": moderator_list}, {"categories": category_list},
+            {"projects": project_list}]
+
+
+class StatisticsRangeResource(Resource):
+    """Endpoint for statistics of an arbitrary date range."""
+    query_parameters = {
+        "from": fields.Str(required=True),
+        "to": fields.Str(missing="today"),
+    }
+
+    @cached
+    @use_args(query_parameters)
+    def get(self, query_parameters):
+        """Returns the statistics of the days from `from` until `to`."""
+        start = string_to_date(query_parameters["from"])
+        start = datetime(start.year, start.month, start.day)
+        end = string_to_date(query_parameters["to"])
+        return jsonify(range_statistics(start, end))
 
 
 def convert(contribution):
@@ -516,34 +1097,22 @@ def batch_contributions(contributions):
 class BatchResource(Resource):
     """Endpoint for the posts to be voted in a batch."""
     def get(self, batch_type):
-        all_contributions = [c for c in DB.contributions.find({
-            "$or": [
-                {"status": "pending"},
-                {"review_status": "pending"}
-            ]
-        })]
-
-        comments = batch_comments(all_contributions)
-        _, comment_usage = init_comments(comments)
-
-        contributions = [convert(c)
-                         for c in batch_contributions(all_contributions)]
-
-        category_share = init_contributions(contributions, comment_usage)
-        next_batch = get_batch(contributions, category_share,
-                               100.0 - comment_usage)
-
+        plan = VOTING_PLAN.get()
         if batch_type == "comments":
-            batch = comments
+            batch = plan.comments
         elif batch_type == "contributions":
-            batch = next_batch
+            batch = plan.contributions
         else:
             return jsonify({})
-        eligible = [json.loads(json_util.dumps(convert(c))) for c in batch]
-        return jsonify(eligible)
+
+        # Clients that already have this version of the plan get a 304
+        response = jsonify(batch)
+        response.set_etag(plan.etag)
+        return response.make_conditional(request)
 
 
 api.add_resource(WeeklyResource, "/api/statistics/<string:date>")
+api.add_resource(StatisticsRangeResource, "/api/statistics")
 api.add_resource(BannedUsersResource, "/api/bannedUsers")
 api.add_resource(ContributionResource, "/api/posts")
 api.add_resource(BatchResource, "/api/batch/<string:batch_type>")
@@ -577,14 +1146,39 @@ def footer_section():
     return section
 
 
+def post_title(url):
+    """Returns the title of the post, or None if it can't be retrieved."""
+    try:
+        return Comment(url).title
+    except Exception as error:
+        LOGGER.error(error)
+        return None
+
+
+def fill_titles(contributions):
+    """Adds the titles of the contributions that have none stored, fetching
+    them concurrently. Returns whether every title could be retrieved.
+    """
+    missing = [c for c in contributions if not c.get("title")]
+    if not missing:
+        return True
+
+    LOGGER.info(f"Fetching {len(missing)} missing titles...")
+    with ThreadPoolExecutor(max_workers=TITLE_WORKERS) as executor:
+        titles = list(executor.map(post_title, [c["url"] for c in missing]))
+        for contribution, title in zip(missing, titles):
+            contribution["title"] = title
+
+    return all(titles)
+
+
 def staff_pick_section(staff_picks):
     """Creates the staff pick section for the Utopian weekly post."""
     LOGGER.info("Generating staff pick statistics section...")
     section = "## Staff Picks"
     for staff_pick in staff_picks["staff_picks"]:
         url = staff_pick["url"]
-        post = Comment(url)
-        title = post.json()["title"]
+        title = staff_pick.get("title")
 
         # If title can't be retrieved set it to the post's URL
         if not title:
@@ -629,7 +1223,7 @@ def post_statistics_section(categories, contributions):
         contributions, key=lambda x: x["total_payout"], reverse=True)[0]
     most_engagement = sorted(
         contributions, key=lambda x: x["total_votes"], reverse=True)[0]
-    title = Comment(most_engagement["url"]).title
+    title = most_engagement.get("title") or most_engagement["url"]
 
     # Create the section with the above statistics
     section += (
@@ -679,10 +1273,17 @@ def post_statistics_section(categories, contributions):
 
 @app.route("/weekly", defaults={"date": "today"})
 @app.route("/weekly/<date>")
+@cached
 def weekly(date):
     """Returns weekly statistics in a format that can be posted on Steemit."""
     today = string_to_date(date)
     week_ago = today - timedelta(days=7)
+
+    # Serve the stored post of the week if it exists
+    weekly_post = DB.weekly_posts.find_one({"date": today})
+    if weekly_post:
+        return render_template("weekly.html", body=weekly_post["body"])
+
     contributions = DB.contributions
     pipeline = [
         {"$match": {"review_date": {"$gte": week_ago, "$lte": today}}}]
@@ -693,6 +1294,12 @@ def weekly(date):
     categories = category_statistics(contributions)
     staff_picks = staff_pick_statistics(contributions)
 
+    # Only titles that weren't stored by the updater are fetched
+    complete = True
+    if contributions:
+        most_engagement = max(contributions, key=lambda x: x["total_votes"])
+        complete = fill_titles(staff_picks["staff_picks"] + [most_engagement])
+
     # Get each section of the post
     try:
         post_intro_section = intro_section(week_ago, today)
@@ -707,7 +1314,19 @@ def weekly(date):
         body = "<br><br>".join([post_intro_section, staff_section,
                                 post_section, post_footer_section])
         LOGGER.info(body)
-    return render_template("weekly.html", body=body)
+
+        # Like the weekly statistics, only weeks ending at midnight are
+        # stored; the updater removes them once contributions in them change.
+        # Posts with titles replaced by URLs aren't stored, so they're retried
+        if (complete and
+                today == datetime(today.year, today.month, today.day)):
+            DB.weekly_posts.replace_one(
+                {"date": today}, {"date": today, "body": body}, True)
+
+    response = make_response(render_template("weekly.html", body=body))
+    if not complete:
+        response.cache_control.no_store = True
+    return response
 
 
 def update_vp(current_vp, updated, recharge_time):
@@ -733,9 +1352,54 @@ def update_vp(current_vp, updated, recharge_time):
     return float(current_vp), str(recharge_time).split(".")[0]
 
 
+class AccountState():
+    """In-process copy of the utopian-io account data that the updater
+    stores. A background thread reads it again every `ttl` seconds, and
+    requests only read it themselves if the copy is more than twice as old.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.account = None
+        self.loaded = 0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        """Reads the account data from the database."""
+        account = DB.accounts.find_one({"account": "utopian-io"})
+        with self.lock:
+            self.account = account
+            self.loaded = time.monotonic()
+
+    def run(self):
+        """Refreshes the account data until the application exits."""
+        while True:
+            time.sleep(self.ttl)
+            try:
+                self.refresh()
+            except Exception as error:
+                LOGGER.error(error)
+
+    def get(self):
+        """Returns the account data, starting the background refresh on
+        first use.
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            stale = time.monotonic() - self.loaded > 2 * self.ttl
+
+        if self.account is None or stale:
+            self.refresh()
+        return self.account
+
+
+ACCOUNT_STATE = AccountState(ACCOUNT_TTL)
+
+
 def account_information():
-    accounts = DB.accounts
-    account = accounts.find_one({"account": "utopian-io"})
+    account = ACCOUNT_STATE.get()
     updated = account["updated"]
     current_vp, recharge_time = update_vp(
         account["current_vp"], updated, account["recharge_time"])
@@ -1051,9 +1715,9 @@ def get_comment_weights():
     the voting weight needed upvote a review comment with each category's point
     equivalence in STU.
     """
-    account = Account("utopian-io")
+    voting_value = ACCOUNT_STATE.get()["voting_value"]
     comment_weights = {
-        category: 100.0 * points / account.get_voting_value_SBD() for
+        category: 100.0 * points / voting_value for
         category, points in MODERATION_REWARD.items()
     }
 
@@ -1072,46 +1736,96 @@ def init_comments(comments):
     return comment_weights, comment_usage
 
 
+class VotingPlan():
+    """Snapshot of the pending contributions and review comments, and of
+    those that will be voted on in the next round. A plan stays valid until
+    the generation of the contributions or of the account data changes.
+    """
+    def __init__(self, generation):
+        self.generation = generation
+        self.pending = list(DB.contributions.find({
+            "$or": [
+                {"status": "pending"},
+                {"review_status": "pending"}
+            ]
+        }))
+
+        # `convert` changes the contributions, so the plan uses copies
+        all_contributions = deepcopy(self.pending)
+        comments = batch_comments(all_contributions)
+        _, comment_usage = init_comments(comments)
+
+        # Every contribution that can be voted on, converted like the batch
+        self.pending_contributions = [
+            convert(c) for c in batch_contributions(all_contributions)]
+
+        category_share = init_contributions(self.pending_contributions,
+                                            comment_usage)
+        self.contributions = get_batch(self.pending_contributions,
+                                       category_share, 100.0 - comment_usage)
+        self.comments = [convert(c) for c in comments]
+
+        self.contribution_urls = {c["url"] for c in self.contributions}
+        self.comment_urls = {c["url"] for c in self.comments}
+
+        # Each worker computes its own plan at a different time, so the ETag
+        # is derived from what was planned instead of the generation
+        planned = json_util.dumps([self.contributions, self.comments],
+                                  sort_keys=True)
+        self.etag = hashlib.sha1(planned.encode()).hexdigest()
+
+
+class VotingPlanService():
+    """Keeps the voting plan of the current data generation, so the queue,
+    the comments page and the batch endpoint share a single computation.
+    """
+    def __init__(self):
+        self.plan = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """Returns the plan, computing it if the data changed."""
+        # The plan also depends on the voting power
+        generation = (data_generation(), data_generation("account"))
+        with self.lock:
+            if self.plan is None or self.plan.generation != generation:
+                LOGGER.info(f"Computing voting plan {generation}")
+                self.plan = VotingPlan(generation)
+            return self.plan
+
+
+VOTING_PLAN = VotingPlanService()
+
+
+def vote_time(recharge_time):
+    """Returns when the next voting round starts."""
+    hours, minutes, seconds = [int(x) for x in recharge_time.split(":")]
+    return datetime.now() + timedelta(
+        hours=hours, minutes=minutes, seconds=seconds)
+
+
 @app.route("/queue")
 def queue():
     """Returns all pending contributions and sets attribute `next_batch` if the
     contribution will be included in the next voting round.
     """
-    all_contributions = [c for c in DB.contributions.find({
-        "$or": [
-            {"status": "pending"},
-            {"review_status": "pending"}
-        ]
-    })]
+    plan = VOTING_PLAN.get()
 
     current_vp, recharge_time, recharge_class = account_information()
     if not recharge_time:
         recharge_time = "0:0:0"
 
-    comments = batch_comments(all_contributions)
-    _, comment_usage = init_comments(comments)
-
-    contributions = [convert(c)
-                     for c in batch_contributions(all_contributions)]
-
-    category_share = init_contributions(contributions, comment_usage)
-    batch = get_batch(contributions, category_share, 100.0 - comment_usage)
-
-    for contribution in batch:
-        contribution["next_batch"] = True
-        hours, minutes, seconds = [int(x) for x in recharge_time.split(":")]
-        contribution["vote_time"] = datetime.now() + timedelta(
-            hours=hours, minutes=minutes, seconds=seconds)
+    # The plan is shared, so the attributes are set on copies
+    batch = [dict(c, next_batch=True, vote_time=vote_time(recharge_time))
+             for c in plan.contributions]
 
     remaining_contributions = []
-    for contribution in all_contributions:
-        if (contribution in batch or contribution["status"] != "pending" or
-                not contribution["valid_age"]):
+    for contribution in plan.pending_contributions:
+        if contribution["url"] in plan.contribution_urls:
             continue
 
-        contribution["next_batch"] = False
-        contribution["vote_time"] = "TBD"
-        remaining_contributions.append(contribution)
+        remaining_contributions.append(
+            dict(contribution, next_batch=False, vote_time="TBD"))
 
     contributions = batch + sorted(remaining_contributions,
                                    key=lambda x: x["score"], reverse=True)
@@ -1126,33 +1840,22 @@ def moderator_comments():
     """Returns all pending review comments and sets attribute `next_batch` if
     the comment will be included in the next voting round.
     """
-    all_contributions = [c for c in DB.contributions.find({
-        "$or": [
-            {"status": "pending"},
-            {"review_status": "pending"}
-        ]
-    })]
+    plan = VOTING_PLAN.get()
 
     current_vp, recharge_time, recharge_class = account_information()
     if not recharge_time:
         recharge_time = "0:0:0"
 
-    batch = batch_comments(all_contributions)
     pending_comments = []
-
-    for comment in all_contributions:
+    for comment in plan.pending:
         if comment["review_status"] != "pending":
             continue
 
-        if comment in batch:
-            comment["next_batch"] = True
-            hours, minutes, seconds = [int(x) for x in
-                                       recharge_time.split(":")]
-            comment["vote_time"] = datetime.now() + timedelta(
-                hours=hours, minutes=minutes, seconds=seconds)
+        if comment["url"] in plan.comment_urls:
+            comment = dict(comment, next_batch=True,
+                           vote_time=vote_time(recharge_time))
         else:
-            comment["next_batch"] = False
-            comment["vote_time"] = "TBD"
+            comment = dict(comment, next_batch=False, vote_time="TBD")
 
         pending_comments.append(comment)
 
@@ -1170,7 +1873,7 @@ def inject_last_updated():
                          "development", "blog", "ideas", "social", "all",
                          "bug-hunting", "video-tutorials", "translations",
                          "anti-abuse", "iamutopian"])
-    account = DB.accounts.find_one({"account": "utopian-io"})
+    account = ACCOUNT_STATE.get()
     return dict(last_updated=account["updated"].strftime("%H:%M %Z"),
                 categories=categories)
 
@@ -4,11 +4,12 @@ import math
 import os
 import requests
 import threading
-from multiprocessing import Pool
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from dateutil.parser import parse
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne
+from requests.adapters import HTTPAdapter
 from steem import Steem
+from urllib3.util.retry import Retry
 
 try:
     from urllib import urlencode
@@ -27,6 +28,17 @@ HEADERS = {
     "x-api-key-id": os.environ["API_KEY_ID"]
 }
 
+# Number of pages fetched concurrently
+MAX_WORKERS = 4
+
+# Keep-alive session that retries failed requests with exponential backoff
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_maxsize=MAX_WORKERS,
+    max_retries=Retry(total=5, backoff_factor=1,
+                      status_forcelist=[429, 500, 502, 503, 504])))
+
 
 def generate_url(action, parameters):
     return f"{UTOPIAN_API}{action}/?{urlencode(parameters)}"
@@ -78,20 +90,35 @@ def create_post(post, status, update=True):
     return new_post
 
 
+def page_parameters(status, limit, skip):
+    """Returns the query parameters of a page of posts with the status."""
+    if not status == "pending":
+        return {"status": status, "limit": limit, "skip": skip}
+    return {"filterBy": "review", "limit": limit, "skip": skip}
+
+
+def fetch_page(parameters):
+    """Returns the posts of the page, or None if it couldn't be fetched."""
+    url = generate_url("posts", parameters)
+    print(f"{datetime.datetime.now()} - Fetching from {url}")
+    r = SESSION.get(url)
+    if r.status_code == 200:
+        return r.json()["results"]
+    return None
+
+
 def get_posts(status, update=True):
     posts = []
     limit = 1000
-    skip = 0
     action = "posts"
     posts = DB.posts
 
     # Get total amount of posts submitted to Utopian.io
     if not status == "pending":
-        r = requests.get(generate_url(action, {"status": status, "limit": 1}),
-                         headers=HEADERS)
+        r = SESSION.get(generate_url(action, {"status": status, "limit": 1}))
     else:
-        r = requests.get(generate_url(action, {"filterBy": "review",
-                         "limit": 1}), headers=HEADERS)
+        r = SESSION.get(generate_url(action, {"filterBy": "review",
+                        "limit": 1}))
     if r.status_code == 200:
         total = r.json()["total"]
         total = math.ceil(total / 1000)
@@ -102,65 +129,107 @@ def get_posts(status, update=True):
 
     # Get ALL posts submitted to Utopian.io
     if not update:
-        for _ in range(total):
-            if not status == "pending":
-                parameters = {"status": status, "limit": limit, "skip": skip}
-            else:
-                parameters = {"filterBy": "review", "limit": limit, "skip": skip}
-            url = generate_url(action, parameters)
-            print(f"{datetime.datetime.now()} - Fetching from {url}")
-            r = requests.get(url, headers=HEADERS)
-            if r.status_code == 200:
-                pool = Pool()
-                x = partial(create_post, status=status, update=False)
-                post_list = pool.map(x, r.json()["results"])
-                pool.close()
-                pool.join()
-                for post in post_list:
+        pages = [page_parameters(status, limit, page * limit)
+                 for page in range(total)]
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            for results in executor.map(fetch_page, pages):
+                if results is None:
+                    time = datetime.datetime.now()
+                    print(f"{time} - Something went wrong, please try again later.")
+                    return
+                for result in results:
+                    post = create_post(result, status=status, update=False)
                     if not post == None:
                         posts.replace_one({"_id": post["_id"]}, post, True)
-            else:
-                time = datetime.datetime.now()
-                print(f"{time} - Something went wrong, please try again later.")
-                return
-            skip += 1000
     # Get posts submitted to Utopian.io within the last week
     else:
-        week = datetime.datetime.now() - datetime.timedelta(days=7)
-        for _ in range(total):
-            parameters = {"status": status, "limit": limit, "skip": skip}
-            url = generate_url(action, parameters)
-            print(f"{datetime.datetime.now()} - Fetching from {url}")
-            r = requests.get(url, headers=HEADERS)
-            if r.status_code == 200:
-                pool = Pool()
-                x = partial(create_post, status=status, update=True)
-                post_list = pool.map(x, r.json()["results"])
-                pool.close()
-                pool.join()
-                for post in post_list:
-                    if post is None:
-                        return
-                    database_post = posts.find_one({"_id": post["_id"]})
-                    if database_post and "flagged" in database_post:
-                        if (not database_post["flagged"] == post["flagged"]
-                            or database_post["modified"]):
-                            post["modified"] = True
-                    posts.replace_one({"_id": post["_id"]}, post, True)
-                    if post["created"] < week:
-                        return
-            else:
-                time = datetime.datetime.now()
-                print(f"{time} - Something went wrong, please try again later.")
-                return
-
-            skip += 1000
+        sync_posts(status, total, limit)
+
+
+def last_activity(post):
+    """Returns the last time the post was edited or commented on."""
+    return max(post["last_update"], post["active"])
+
+
+# Fields moderation changes without changing the post's last activity
+MODERATION_FIELDS = ["status", "moderator", "score", "flagged"]
+
+
+def moderation_changed(post, database_post):
+    """Checks if the post was moderated since it was stored."""
+    return any(post.get(field) != database_post.get(field)
+               for field in MODERATION_FIELDS)
+
+
+def sync_posts(status, total, limit):
+    """Updates the posts submitted within the last week that changed since the
+    previous sync, using the stored high-water mark of their last activity.
+    """
+    posts = DB.posts
+    state = DB.sync_state.find_one({"status": status}) or {}
+    watermark = state.get("watermark", datetime.datetime.min)
+    pages = state.get("pages", {})
+    new_watermark = watermark
+
+    for page in range(total):
+        parameters = {"status": status, "limit": limit, "skip": page * limit}
+        url = generate_url("posts", parameters)
+        cached = pages.get(str(page))
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+
+        print(f"{datetime.datetime.now()} - Fetching from {url}")
+        r = SESSION.get(url, headers=headers)
+
+        # Page didn't change, so continue unless it was the last one needed
+        if r.status_code == 304:
+            if cached["last_page"]:
+                break
+            continue
+        elif r.status_code != 200:
+            time = datetime.datetime.now()
+            print(f"{time} - Something went wrong, please try again later.")
+            return
+
+        post_list = [create_post(result, status=status, update=True)
+                     for result in r.json()["results"]]
+        last_page = any(post is None for post in post_list)
+        post_list = [post for post in post_list if post is not None]
+
+        # Only write posts that are new, had activity after the watermark or
+        # were moderated
+        ids = [post["_id"] for post in post_list]
+        database_posts = {p["_id"]: p for p in posts.find({"_id": {"$in": ids}})}
+        operations = []
+        for post in post_list:
+            database_post = database_posts.get(post["_id"])
+            if (database_post and last_activity(post) <= watermark and
+                    not moderation_changed(post, database_post)):
+                continue
+            if database_post and "flagged" in database_post:
+                if (not database_post["flagged"] == post.get("flagged")
+                        or database_post["modified"]):
+                    post["modified"] = True
+            operations.append(ReplaceOne({"_id": post["_id"]}, post, True))
+            new_watermark = max(new_watermark, last_activity(post))
+
+        if operations:
+            posts.bulk_write(operations, ordered=False)
+
+        if "ETag" in r.headers:
+            pages[str(page)] = {"etag": r.headers["ETag"],
+                                "last_page": last_page}
+        if last_page:
+            break
+
+    DB.sync_state.replace_one(
+        {"status": status},
+        {"status": status, "watermark": new_watermark, "pages": pages}, True)
 
 
 def get_moderators():
     action = "moderators"
     url = generate_url(action, {})
-    r = requests.get(url, headers=HEADERS)
+    r = SESSION.get(url)
     if r.status_code == 200:
         return r.json()["results"]
     else: